@@ -1,13 +1,39 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, render_template_string, Response, stream_with_context
 from flask_cors import CORS
 from chatbot import GovernmentChatbot
+from session_store import create_session_store
+from query_log import create_query_log
 import os
+import json
+import uuid
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 CORS(app)
 
 # Initialize chatbot
-chatbot = GovernmentChatbot()
+session_store = create_session_store()
+chatbot = GovernmentChatbot(session_store=session_store, query_log=create_query_log())
+
+# Cookie identifying a conversation so follow-up questions keep their context
+SESSION_COOKIE = 'chat_session'
+
+# Upper bound on ranked candidates returned by /chat
+MAX_TOP_K = 10
+
+# Approximate size of answer chunks sent by /chat/stream
+STREAM_CHUNK_SIZE = 120
+
+# The page URL is not versioned, so browsers revalidate it with its ETag on every
+# visit; an unchanged page costs only a 304
+INDEX_CACHE_CONTROL = 'no-cache'
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="en">
@@ -177,7 +203,7 @@ HTML_TEMPLATE = """
             input.value = '';
             
             try {
-                const response = await fetch('/chat', {
+                const response = await fetch('/chat/stream', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json'
@@ -188,14 +214,60 @@ HTML_TEMPLATE = """
                     })
                 });
                 
-                const data = await response.json();
-                addMessage(data.response, 'bot');
+                if (!response.body || !response.body.getReader) {
+                    // No streaming support, render the whole answer at once
+                    const data = parseEvents(await response.text()).events;
+                    addMessage(data.map(e => e.event === 'chunk' ? e.data.text : e.event === 'error' ? e.data.response : '').join(''), 'bot');
+                    return;
+                }
+                
+                // Render answer chunks as they arrive
+                const messageDiv = addMessage('', 'bot');
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                
+                while (true) {
+                    const { done, value } = await reader.read();
+                    if (done) break;
+                    
+                    const parsed = parseEvents(buffer + decoder.decode(value, { stream: true }));
+                    buffer = parsed.rest;
+                    parsed.events.forEach(e => {
+                        if (e.event === 'chunk') {
+                            appendToMessage(messageDiv, e.data.text);
+                        } else if (e.event === 'error') {
+                            appendToMessage(messageDiv, e.data.response);
+                        }
+                    });
+                }
                 
             } catch (error) {
                 addMessage('Sorry, I encountered an error. Please try again.', 'bot');
             }
         }
         
+        function parseEvents(text) {
+            // Split server-sent events; an incomplete trailing event is returned as rest
+            const blocks = text.split('\\n\\n');
+            const rest = blocks.pop();
+            const events = blocks.map(block => {
+                const e = { event: 'message', data: null };
+                block.split('\\n').forEach(line => {
+                    if (line.startsWith('event: ')) e.event = line.slice(7);
+                    if (line.startsWith('data: ')) e.data = JSON.parse(line.slice(6));
+                });
+                return e;
+            });
+            return { events: events, rest: rest };
+        }
+        
+        function appendToMessage(messageDiv, text) {
+            const messagesDiv = document.getElementById('chatMessages');
+            messageDiv.textContent += text;
+            messagesDiv.scrollTop = messagesDiv.scrollHeight;
+        }
+        
         function addMessage(message, sender) {
             const messagesDiv = document.getElementById('chatMessages');
             const messageDiv = document.createElement('div');
@@ -203,29 +275,76 @@ HTML_TEMPLATE = """
             messageDiv.textContent = message;
             messagesDiv.appendChild(messageDiv);
             messagesDiv.scrollTop = messagesDiv.scrollHeight;
+            return messageDiv;
         }
     </script>
 </body>
 </html>
 """
 
+def _build_index_page():
+    """Render the chat page once and pre-compress it for each supported encoding"""
+    with app.app_context():
+        html = render_template_string(HTML_TEMPLATE).encode('utf-8')
+    
+    digest = hashlib.sha256(html).hexdigest()[:16]
+    page = {'identity': (html, digest)}
+    page['gzip'] = (gzip.compress(html, compresslevel=9, mtime=0), f'{digest}-gzip')
+    if brotli is not None:
+        page['br'] = (brotli.compress(html, quality=11), f'{digest}-br')
+    return page
+
+INDEX_PAGE = _build_index_page()
+
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    encoding = next(
+        (e for e in ('br', 'gzip') if e in INDEX_PAGE and request.accept_encodings[e] > 0),
+        'identity'
+    )
+    body, etag = INDEX_PAGE[encoding]
+    
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = INDEX_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/chat', methods=['POST'])
 def chat():
+    data = request.get_json(silent=True) or {}
+    try:
+        top_k = _parse_top_k(data)
+    except ValueError as e:
+        return jsonify({
+            'response': 'Sorry, I could not understand your request.',
+            'status': 'error',
+            'error': str(e)
+        }), 400
+    
     try:
-        data = request.get_json()
         message = data.get('message', '')
         language = data.get('language', 'english')
+        session_id = _session_id(data)
         
-        response = chatbot.get_response(message, language)
+        if not top_k:
+            response = chatbot.get_response(message, language, session_id=session_id)
+            
+            return _with_session(jsonify({
+                'response': response,
+                'status': 'success'
+            }), session_id)
         
-        return jsonify({
-            'response': response,
-            'status': 'success'
-        })
+        # Ranked candidates for "did you mean" suggestions
+        result = chatbot.get_response(message, language, top_k=top_k, session_id=session_id)
+        result['status'] = 'success'
+        return _with_session(jsonify(result), session_id)
     except Exception as e:
         return jsonify({
             'response': 'Sorry, I encountered an error processing your request.',
@@ -233,6 +352,95 @@ def chat():
             'error': str(e)
         })
 
+def _parse_top_k(data):
+    """top_k from a request body clamped to 1..MAX_TOP_K, or None when not requested"""
+    if not isinstance(data, dict):
+        raise ValueError('request body must be a JSON object')
+    top_k = data.get('top_k')
+    if not top_k:
+        return None
+    try:
+        top_k = int(top_k)
+    except (TypeError, ValueError):
+        raise ValueError('top_k must be an integer')
+    return max(1, min(top_k, MAX_TOP_K))
+
+def _session_id(data):
+    """Conversation id from the request body or cookie, or a new one"""
+    return str(data.get('session_id') or request.cookies.get(SESSION_COOKIE) or uuid.uuid4().hex)[:64]
+
+def _with_session(response, session_id):
+    """Keep the conversation id in a cookie for as long as its context lives"""
+    response.set_cookie(SESSION_COOKIE, session_id, max_age=session_store.ttl, httponly=True, samesite='Lax')
+    return response
+
+def _chunk_text(text, size=STREAM_CHUNK_SIZE):
+    """Split text into chunks of about size characters at word boundaries"""
+    chunks = []
+    while len(text) > size:
+        cut = text.rfind(' ', 0, size) + 1 or size
+        chunks.append(text[:cut])
+        text = text[cut:]
+    if text:
+        chunks.append(text)
+    return chunks
+
+def _sse(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the match metadata first, then the answer in chunks, as server-sent events"""
+    data = request.get_json(silent=True) or {}
+    try:
+        top_k = _parse_top_k(data) or 1
+    except ValueError as e:
+        # Still answer in the stream format so the page shows the error
+        return Response(_sse('error', {
+            'response': 'Sorry, I could not understand your request.',
+            'status': 'error',
+            'error': str(e)
+        }), status=400, mimetype='text/event-stream')
+    message = data.get('message', '')
+    language = data.get('language', 'english')
+    session_id = _session_id(data)
+    
+    def generate():
+        try:
+            result = chatbot.get_response(message, language, top_k=top_k, session_id=session_id)
+            response = result.pop('response')
+            result['status'] = 'success'
+            yield _sse('meta', result)
+            
+            for chunk in _chunk_text(response):
+                yield _sse('chunk', {'text': chunk})
+            
+            yield _sse('done', {'status': 'success'})
+        except Exception as e:
+            yield _sse('error', {
+                'response': 'Sorry, I encountered an error processing your request.',
+                'status': 'error',
+                'error': str(e)
+            })
+    
+    return _with_session(Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    }), session_id)
+
+@app.route('/api/sessions/stats', methods=['GET'])
+def session_stats():
+    """API endpoint reporting active conversation sessions and their memory use"""
+    return jsonify(session_store.stats())
+
+@app.route('/api/query-log/stats', methods=['GET'])
+def query_log_stats():
+    """API endpoint reporting this worker's query log and the entries it dropped"""
+    if chatbot.query_log is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(chatbot.query_log.stats(), enabled=True))
+
 @app.route('/api/train', methods=['POST'])
 def train():
     """API endpoint to retrain the chatbot with new data"""
@@ -0,0 +1,131 @@
+"""Measure the fuzzy fallback: accuracy on noisy queries, false matches on off-topic ones, and latency at scale.
+
+Usage: python benchmark_fuzzy.py [--entries 100000] [--queries 1000]
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+import numpy as np
+from benchmark_matching import build
+from chatbot import GovernmentChatbot
+
+# (query, expected answer id) pairs with misspellings and romanized Hindi
+NOISY_QUERIES = [
+    ('irigation charjes', 'en-05'),
+    ('documnets requird', 'en-04'),
+    ('contcat informaton', 'en-08'),
+    ('drainge problms', 'en-07'),
+    ('watr availibility', 'en-06'),
+    ('complant regstration', 'en-09'),
+    ('sinchai shulk', 'hi-04'),
+    ('shikayat kaise karen', 'hi-06'),
+    ('paani uplabdhta', 'hi-05'),
+    ('sampark jankari', 'hi-07'),
+    ('sinchai kanekshan avedan', 'hi-02'),
+    ('jal sansadhan vibhag', 'hi-01'),
+]
+
+# Queries that must not be answered; several share suffixes or are one edit from an indexed word
+OFF_TOPIC_QUERIES = [
+    'election', 'selection', 'direction', 'action', 'fiction', 'winter', 'station', 'nation', 'later', 'waiter',
+    'election results', 'science fiction books', 'railway station enquiry', 'see you later',
+    'weather forecast tomorrow', 'cricket score today', 'pizza delivery near me', 'stock market news',
+    'how to cook rice', 'football world cup', 'mobile recharge offers', 'bollywood songs',
+]
+
+SYLLABLES = ['ka', 'ri', 'to', 'man', 'sel', 'dor', 'vi', 'pa', 'lun', 'ger', 'shi', 'tra', 'no', 'bel', 'qu', 'ast']
+
+
+def synthetic_entries(count, rng):
+    vocabulary = list({''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(count // 2)})
+    return [{
+        'id': f"syn-{i}",
+        'question': ' '.join(rng.choices(vocabulary, k=6)),
+        'answer': f"Answer {i}",
+        'category': f"category-{i % 10}",
+        'language': 'en',
+        'keywords': ', '.join(rng.choices(vocabulary, k=4)),
+    } for i in range(count)]
+
+
+def misspell(word, rng):
+    i = rng.randrange(len(word))
+    edit = rng.choice(['delete', 'substitute', 'transpose'])
+    if edit == 'delete':
+        return word[:i] + word[i + 1:]
+    if edit == 'substitute':
+        return word[:i] + rng.choice('aeioulnrst') + word[i + 1:]
+    i = min(i, len(word) - 2)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def noisy_accuracy():
+    print(f"{'':<12}{'noisy top-1':>22}{'off-topic matched':>22}")
+    print(f"{'mode':<12}{'word only':>11}{'with fuzzy':>11}{'word only':>11}{'with fuzzy':>11}")
+    for match_mode in ('variations', 'compact'):
+        chatbot = build(match_mode)
+        word_only = 0
+        with_fuzzy = 0
+        for query, expected_id in NOISY_QUERIES:
+            message = chatbot._preprocess_message(query, 'english')
+            result = chatbot._find_best_response(message)
+            with_fuzzy += result['answer_id'] == expected_id
+            word_only += result['matched_by'] == 'word' and result['answer_id'] == expected_id
+        false_word = 0
+        false_fuzzy = 0
+        for query in OFF_TOPIC_QUERIES:
+            result = chatbot._find_best_response(chatbot._preprocess_message(query, 'english'))
+            false_word += result['matched_by'] == 'word'
+            false_fuzzy += result['matched']
+        print(f"{match_mode:<12}{word_only / len(NOISY_QUERIES):>11.0%}{with_fuzzy / len(NOISY_QUERIES):>11.0%}"
+              f"{false_word / len(OFF_TOPIC_QUERIES):>11.0%}{false_fuzzy / len(OFF_TOPIC_QUERIES):>11.0%}")
+
+
+def scale(entry_count, query_count):
+    rng = random.Random(0)
+    entries = synthetic_entries(entry_count, rng)
+
+    start = time.perf_counter()
+    chatbot = GovernmentChatbot(match_mode='compact', load=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        chatbot.train(entries)
+    index = chatbot.fuzzy_index
+    print(f"Trained on {entry_count} entries in {time.perf_counter() - start:.1f}s "
+          f"({index.term_entries.shape[0]} fuzzy terms, {len(index.postings)} trigrams)")
+
+    # Word-level scoring misses and the fuzzy pass runs, so the total covers both
+    latencies = []
+    fuzzy_latencies = []
+    hits = 0
+    for _ in range(query_count):
+        position = rng.randrange(entry_count)
+        words = entries[position]['question'].split()[:2]
+        query = ' '.join(misspell(word, rng) for word in words)
+        timings = {}
+        start = time.perf_counter()
+        result = chatbot._find_best_response(query, timings=timings)
+        latencies.append((time.perf_counter() - start) * 1000)
+        fuzzy_latencies.append(timings.get('fuzzy', 0.0))
+        hits += result['answer_id'] == entries[position]['id']
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+    fuzzy_p50, fuzzy_p99 = np.percentile(fuzzy_latencies, [50, 99])
+    print(f"Two misspelled words: source entry answered for {hits / query_count:.1%}, "
+          f"total latency ms p50 {p50:.2f} p99 {p99:.2f} max {max(latencies):.2f} "
+          f"(fuzzy pass p50 {fuzzy_p50:.2f} p99 {fuzzy_p99:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    noisy_accuracy()
+    scale(args.entries, args.queries)
+
+
+if __name__ == '__main__':
+    main()
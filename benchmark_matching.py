@@ -0,0 +1,72 @@
+"""Compare the 'variations' and 'compact' match modes on labelled citizen queries.
+
+Usage: python benchmark_matching.py [--repeat N]
+"""
+import argparse
+import pickle
+import time
+import numpy as np
+from chatbot import GovernmentChatbot, MATCH_MODES
+from labelled_queries import LABELLED_QUERIES
+
+
+def build(match_mode):
+    """Train a chatbot in the given mode without touching the saved model or the network"""
+    chatbot = GovernmentChatbot(match_mode=match_mode, load=False)
+    chatbot.train(chatbot.get_knowledge_entries())
+    return chatbot
+
+
+def index_rows(chatbot):
+    if chatbot.match_mode == 'compact':
+        return chatbot.index.size
+    return chatbot.response_matrix.shape[0]
+
+
+def artifact_bytes(chatbot):
+    return len(pickle.dumps({
+        'vectorizer': chatbot.vectorizer,
+        'classifier': chatbot.classifier,
+        'entries': chatbot.entries,
+        'index': chatbot.index,
+        'response_matrix': chatbot.response_matrix,
+        'response_offsets': chatbot.response_offsets,
+        'fuzzy_index': chatbot.fuzzy_index
+    }))
+
+
+def evaluate(chatbot, repeat):
+    correct = 0
+    latencies = []
+    for query, expected_id in LABELLED_QUERIES:
+        message = chatbot._preprocess_message(query, 'english')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            scores = chatbot._score_entries(chatbot._vectorize_query(message))
+            best = int(np.argmax(chatbot._ranking(scores, 'english')))
+            latencies.append(time.perf_counter() - start)
+        if scores[best] >= chatbot.similarity_threshold and chatbot.entries[best]['id'] == expected_id:
+            correct += 1
+    latencies = np.array(latencies) * 1000
+    return {
+        'top1': correct / len(LABELLED_QUERIES),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per query')
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'rows':>8}{'bytes':>10}{'top-1':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for match_mode in MATCH_MODES:
+        chatbot = build(match_mode)
+        result = evaluate(chatbot, args.repeat)
+        print(f"{match_mode:<12}{index_rows(chatbot):>8}{artifact_bytes(chatbot):>10}"
+              f"{result['top1']:>8.2%}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,26 +2,63 @@ import re
 import json
 import pickle
 import os
+import time
 from datetime import datetime
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.naive_bayes import MultinomialNB
 from data_processor import DataProcessor
 from language_handler import LanguageHandler
+from question_index import QuestionIndex, group_max
+from fuzzy_index import FuzzyIndex
 import numpy as np
 
+# Bump when the pickled model layout changes so stale artifacts are retrained
+MODEL_VERSION = 4
+MATCH_MODES = ('variations', 'compact')
+# Below this cosine similarity a category-level response is given instead of an answer
+SIMILARITY_THRESHOLD = 0.1
+# Minimum character trigram score for the fuzzy fallback to answer
+FUZZY_THRESHOLD = 0.5
+# Score bonus for entries in the category of the previous turn, halved per older turn
+CONTEXT_BONUS = 0.05
+CONTEXT_DECAY = 0.5
+
+def _elapsed_ms(since):
+    """Milliseconds elapsed since a time.perf_counter() reading"""
+    return round((time.perf_counter() - since) * 1000, 3)
+
 class GovernmentChatbot:
-    def __init__(self):
+    def __init__(self, match_mode=None, model_path='chatbot_model.pkl', load=True,
+                 similarity_threshold=SIMILARITY_THRESHOLD, session_store=None, query_log=None,
+                 fuzzy_threshold=FUZZY_THRESHOLD):
         self.data_processor = DataProcessor()
         self.language_handler = LanguageHandler()
         self.vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
         self.classifier = MultinomialNB()
         
+        # 'variations' expands keywords into templated questions, 'compact' indexes each entry once
+        self.match_mode = match_mode or os.environ.get('CHATBOT_MATCH_MODE', 'variations')
+        if self.match_mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {self.match_mode}")
+        self.model_path = model_path
+        self.similarity_threshold = similarity_threshold
+        self.fuzzy_threshold = fuzzy_threshold
+        self.session_store = session_store
+        self.query_log = query_log
+        
         # Knowledge base
         self.knowledge_base = {}
-        self.responses = {}
+        self.entries = []
+        self.entry_categories = np.array([])
+        self.index = None
+        self.fuzzy_index = None
+        self.response_matrix = None
+        self.response_offsets = None
         self.trained = False
         
+        if not load:
+            return
+        
         # Load existing data if available
         self.load_existing_model()
         
@@ -32,37 +69,57 @@ class GovernmentChatbot:
     def load_existing_model(self):
         """Load pre-trained model if exists"""
         try:
-            if os.path.exists('chatbot_model.pkl'):
-                with open('chatbot_model.pkl', 'rb') as f:
+            if os.path.exists(self.model_path):
+                with open(self.model_path, 'rb') as f:
                     model_data = pickle.load(f)
-                    self.vectorizer = model_data['vectorizer']
-                    self.classifier = model_data['classifier']
-                    self.knowledge_base = model_data['knowledge_base']
-                    self.responses = model_data['responses']
-                    self.trained = True
-                    print("Loaded existing chatbot model")
+                if model_data.get('model_version') != MODEL_VERSION:
+                    print("Existing chatbot model is outdated, retraining")
+                    return
+                if model_data.get('match_mode') != self.match_mode:
+                    print(f"Existing chatbot model uses {model_data.get('match_mode')} mode, retraining")
+                    return
+                self.vectorizer = model_data['vectorizer']
+                self.classifier = model_data['classifier']
+                self.knowledge_base = model_data['knowledge_base']
+                self.entries = model_data['entries']
+                self.index = model_data['index']
+                self.response_matrix = model_data['response_matrix']
+                self.response_offsets = model_data['response_offsets']
+                self.fuzzy_index = model_data['fuzzy_index']
+                self.entry_categories = np.array([entry['category'] for entry in self.entries])
+                self.trained = True
+                print("Loaded existing chatbot model")
         except Exception as e:
             print(f"Could not load existing model: {e}")
     
     def save_model(self):
         """Save trained model"""
         model_data = {
+            'model_version': MODEL_VERSION,
+            'match_mode': self.match_mode,
             'vectorizer': self.vectorizer,
             'classifier': self.classifier,
             'knowledge_base': self.knowledge_base,
-            'responses': self.responses
+            'entries': self.entries,
+            'index': self.index,
+            'response_matrix': self.response_matrix,
+            'response_offsets': self.response_offsets,
+            'fuzzy_index': self.fuzzy_index
         }
-        with open('chatbot_model.pkl', 'wb') as f:
-            pickle.dump(model_data, f)
+        # Write to a per-process temporary file and rename it into place, so workers
+        # retraining at the same time never leave or load a half-written model
+        temp_path = f"{self.model_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                pickle.dump(model_data, f)
+            os.replace(temp_path, self.model_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
         print("Model saved successfully")
     
-    def load_and_process_data(self):
-        """Load and process website data"""
-        print("Processing website data...")
-        
-        # Get processed data from website
-        website_data = self.data_processor.extract_website_data()
-        
+    def get_knowledge_entries(self):
+        """Canonical WRD Bihar question-answer entries, each with a stable answer id"""
         # Comprehensive WRD Bihar Knowledge Base - English
         wrd_knowledge_english = [
             {
@@ -197,8 +254,20 @@ class GovernmentChatbot:
             }
         ]
         
-        # Combine all knowledge data
-        all_knowledge = wrd_knowledge_english + wrd_knowledge_hindi
+        entries = []
+        for language_entries in (wrd_knowledge_english, wrd_knowledge_hindi):
+            for i, entry in enumerate(language_entries, 1):
+                entries.append(dict(entry, id=f"{entry['language']}-{i:02d}"))
+        return entries
+    
+    def load_and_process_data(self):
+        """Load and process website data"""
+        print("Processing website data...")
+        
+        # Get processed data from website
+        website_data = self.data_processor.extract_website_data()
+        
+        all_knowledge = self.get_knowledge_entries()
         
         # Organize knowledge base by categories
         self.knowledge_base = {
@@ -212,17 +281,7 @@ class GovernmentChatbot:
             'schemes': {}
         }
         
-        # Process all knowledge entries
-        questions = []
-        answers = []
-        categories = []
-        
         for entry in all_knowledge:
-            # Add original question and answer
-            questions.append(entry['question'])
-            answers.append(entry['answer'])
-            categories.append(entry['category'])
-            
             # Store in knowledge base by category
             if entry['category'] not in self.knowledge_base:
                 self.knowledge_base[entry['category']] = {}
@@ -230,6 +289,29 @@ class GovernmentChatbot:
             # Create key from question
             key = entry['question'].lower().replace('?', '').strip()
             self.knowledge_base[entry['category']][key] = entry['answer']
+        
+        # Merge website data if available
+        if website_data:
+            self.knowledge_base.update(website_data)
+        
+        if all_knowledge:
+            self.train(all_knowledge)
+            self.save_model()
+        else:
+            print("No training data available")
+    
+    def training_documents(self, entries):
+        """Training documents and the position of the entry each belongs to, for the active match mode"""
+        if self.match_mode == 'compact':
+            # Index each canonical question and its keyword phrases once
+            return QuestionIndex.training_documents(entries)
+        
+        documents = []
+        positions = []
+        for position, entry in enumerate(entries):
+            # Add original question
+            documents.append(entry['question'])
+            positions.append(position)
             
             # Generate keyword-based variations
             if entry['keywords']:
@@ -239,29 +321,41 @@ class GovernmentChatbot:
                     if keyword and len(keyword) > 2:
                         # Generate question variations
                         variations = self._generate_question_variations(keyword, entry['category'])
-                        for variation in variations:
-                            questions.append(variation)
-                            answers.append(entry['answer'])
-                            categories.append(entry['category'])
+                        documents.extend(variations)
+                        positions.extend([position] * len(variations))
+        return documents, positions
+    
+    def train(self, entries):
+        """Fit the vectorizer, classifier and matching index on knowledge entries
         
-        # Merge website data if available
-        if website_data:
-            self.knowledge_base.update(website_data)
+        Returns the classifier's training matrix and category labels.
+        """
+        self.entries = entries
+        self.entry_categories = np.array([entry['category'] for entry in entries])
         
-        if questions:
-            # Train the model
-            X = self.vectorizer.fit_transform(questions)
-            self.classifier.fit(X, categories)
-            
-            # Store responses
-            for i, answer in enumerate(answers):
-                self.responses[questions[i]] = answer
-            
-            self.trained = True
-            self.save_model()
-            print(f"Chatbot trained with {len(questions)} question-answer pairs")
+        documents, positions = self.training_documents(entries)
+        categories = [entries[position]['category'] for position in positions]
+        
+        X = self.vectorizer.fit_transform(documents)
+        self.classifier.fit(X, categories)
+        
+        if self.match_mode == 'compact':
+            self.index = QuestionIndex().fit(self.vectorizer, entries)
+            self.response_matrix = None
+            self.response_offsets = None
+            row_count = self.index.size
         else:
-            print("No training data available")
+            # Keep the vectorized questions so matching is a single sparse product;
+            # rows of one entry are contiguous, starting at its offset
+            self.index = None
+            self.response_matrix = X
+            self.response_offsets = np.searchsorted(positions, np.arange(len(entries))).astype(np.intp)
+            row_count = len(documents)
+        
+        self.fuzzy_index = FuzzyIndex().fit(entries)
+        self.trained = True
+        print(f"Chatbot trained with {row_count} question-answer pairs ({self.match_mode} mode)")
+        return X, categories
     
     def _generate_question_variations(self, keyword, category):
         """Generate question variations for better matching"""
@@ -288,27 +382,79 @@ class GovernmentChatbot:
         
         return variations
     
-    def get_response(self, message, language='english'):
-        """Get chatbot response"""
+    def get_response(self, message, language='english', top_k=None, session_id=None):
+        """Get chatbot response
+        
+        With top_k, a dict with the response, the top_k scored candidates,
+        category probabilities and the threshold decision is returned instead.
+        With session_id, recent turns of the session bias matching toward
+        the categories the conversation is about.
+        """
+        start = time.perf_counter()
+        timings = {}
+        processed_message = None
+        context = []
         try:
             # Preprocess message
             processed_message = self._preprocess_message(message, language)
+            timings['preprocess'] = _elapsed_ms(start)
             
             if not self.trained or not processed_message:
-                return self._get_default_response(language)
-            
-            # Find best matching response
-            response = self._find_best_response(processed_message)
-            
-            # Handle language conversion
-            if language == 'hindi':
-                response = self.language_handler.translate_to_hindi(response)
+                result = self._empty_result(self._get_default_response(language))
+            else:
+                stage = time.perf_counter()
+                if session_id and self.session_store is not None:
+                    context = self.session_store.get(session_id)
+                timings['context'] = _elapsed_ms(stage)
+                
+                # Find best matching response
+                result = self._find_best_response(processed_message, language, max(1, top_k or 1), context, timings)
+                
+                if session_id and self.session_store is not None:
+                    # Remember the matched entry's category, or the predicted one without a match
+                    stage = time.perf_counter()
+                    category = result['candidates'][0]['category'] if result['matched'] else result['category']
+                    self.session_store.append(session_id, category, result['answer_id'])
+                    timings['context'] += _elapsed_ms(stage)
+                
+                # Handle language conversion
+                stage = time.perf_counter()
+                if language == 'hindi':
+                    result['response'] = self.language_handler.translate_to_hindi(result['response'])
+                timings['translate'] = _elapsed_ms(stage)
             
-            return response
+            self._log_query(processed_message, language, result, timings, start, len(context))
+            return result['response'] if top_k is None else result
             
         except Exception as e:
             print(f"Error getting response: {e}")
-            return self._get_error_response(language)
+            result = self._empty_result(self._get_error_response(language))
+            self._log_query(processed_message or message, language, result, timings, start, len(context), str(e))
+            return result['response'] if top_k is None else result
+    
+    def _log_query(self, query, language, result, timings, start, context_turns=0, error=None):
+        """Queue a query log entry; a no-op unless a query log is configured
+        
+        context_turns is the number of earlier session turns that biased the ranking.
+        """
+        if self.query_log is None:
+            return
+        timings['total'] = _elapsed_ms(start)
+        entry = {
+            'ts': time.time(),
+            'query': query,
+            'language': language,
+            'match_mode': self.match_mode,
+            'category': result['category'],
+            'answer_id': result['answer_id'],
+            'score': result['score'],
+            'matched': result['matched'],
+            'context_turns': context_turns,
+            'timings_ms': timings
+        }
+        if error:
+            entry['error'] = error
+        self.query_log.record(entry)
     
     def _preprocess_message(self, message, language):
         """Preprocess user message"""
@@ -317,41 +463,145 @@ class GovernmentChatbot:
         
         # Clean and normalize
         message = message.lower().strip()
-        message = re.sub(r'[^\w\s]', ' ', message)
+        # Devanagari vowel signs and viramas are not \w but belong to the word
+        message = re.sub(r'[^\w\s\u0900-\u0963]', ' ', message)
         message = re.sub(r'\s+', ' ', message)
         
         return message
     
-    def _find_best_response(self, message):
-        """Find best matching response"""
+    def _vectorize_query(self, message):
+        """Vectorize a preprocessed message for the active match mode"""
+        if self.match_mode == 'compact':
+            message = QuestionIndex.normalize_query(message)
+        return self.vectorizer.transform([message])
+    
+    def _score_entries(self, message_vector):
+        """Cosine similarity of the message against every knowledge entry"""
+        if self.match_mode == 'compact':
+            return self.index.score(message_vector)
+        
+        # Rows are L2-normalized, so one sparse product scores every question
+        scores = (self.response_matrix @ message_vector.T).toarray().ravel()
+        return group_max(scores, self.response_offsets)
+    
+    @staticmethod
+    def _top_k(scores, k):
+        """Indices of the k highest scores, best first, from a single partial sort"""
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.array([], dtype=np.intp)
+        if k == 1:
+            return np.array([np.argmax(scores)])
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind='stable')]
+    
+    def _empty_result(self, response):
+        """Result for responses that were not produced by matching"""
+        return {
+            'response': response,
+            'answer_id': None,
+            'matched': False,
+            'matched_by': None,
+            'score': 0.0,
+            'threshold': self.similarity_threshold,
+            'category': None,
+            'category_probabilities': {},
+            'candidates': []
+        }
+    
+    def _ranking(self, scores, language='english', context=None):
+        """Ranking keys biased toward the user's language and the categories of recent turns
+        
+        Only the order changes: entries clearing the similarity threshold stay
+        ahead of those that do not, so a bias never creates or removes a match.
+        """
+        bias = np.zeros(len(scores))
+        for age, (category, _, _) in enumerate(context or []):
+            if category:
+                weight = CONTEXT_BONUS * CONTEXT_DECAY ** age
+                bias = np.maximum(bias, weight * (self.entry_categories == category))
+        if self.match_mode == 'compact':
+            bias = bias + self.index.language_bias(language)
+        above = scores >= self.similarity_threshold
+        return scores + bias * (scores > 0) + 2.0 * above
+    
+    def _find_best_response(self, message, language='english', top_k=1, context=None, timings=None):
+        """Find best matching response and the top_k ranked candidates
+        
+        Per-stage durations in milliseconds are added to timings if given.
+        """
+        timings = {} if timings is None else timings
         try:
             # Vectorize the message
-            message_vector = self.vectorizer.transform([message])
+            stage = time.perf_counter()
+            message_vector = self._vectorize_query(message)
+            timings['vectorize'] = _elapsed_ms(stage)
             
             # Predict category
-            predicted_category = self.classifier.predict(message_vector)[0]
+            stage = time.perf_counter()
+            probabilities = self.classifier.predict_proba(message_vector)[0]
+            predicted_category = str(self.classifier.classes_[int(np.argmax(probabilities))])
+            timings['classify'] = _elapsed_ms(stage)
             
-            # Find most similar question in the category
-            max_similarity = 0
-            best_response = ""
+            # Rank entries by similarity
+            stage = time.perf_counter()
+            scores = self._score_entries(message_vector)
+            top = self._top_k(self._ranking(scores, language, context), top_k)
+            timings['rank'] = _elapsed_ms(stage)
+            max_similarity = float(scores[top[0]]) if len(top) else 0.0
+            matched = max_similarity >= self.similarity_threshold
+            matched_by = 'word' if matched else None
+            threshold = self.similarity_threshold
             
-            for question, answer in self.responses.items():
-                question_vector = self.vectorizer.transform([question])
-                similarity = cosine_similarity(message_vector, question_vector)[0][0]
-                
-                if similarity > max_similarity:
-                    max_similarity = similarity
-                    best_response = answer
+            if not matched and self.fuzzy_index is not None:
+                # Misspelled or romanized queries: fall back to the character trigram index
+                stage = time.perf_counter()
+                fuzzy_scores = self.fuzzy_index.score(message)
+                fuzzy_top = self._top_k(fuzzy_scores, top_k)
+                timings['fuzzy'] = _elapsed_ms(stage)
+                if len(fuzzy_top) and fuzzy_scores[fuzzy_top[0]] >= self.fuzzy_threshold:
+                    scores = fuzzy_scores
+                    top = fuzzy_top
+                    max_similarity = float(scores[top[0]])
+                    matched = True
+                    matched_by = 'fuzzy'
+                    threshold = self.fuzzy_threshold
             
-            # If similarity is too low, provide category-based response
-            if max_similarity < 0.1:
-                return self._get_category_response(predicted_category)
+            if matched:
+                response = self.entries[top[0]]['answer']
+                answer_id = self.entries[top[0]]['id']
+            else:
+                # If similarity is too low, provide category-based response
+                response = self._get_category_response(predicted_category)
+                answer_id = None
             
-            return best_response
+            return {
+                'response': response,
+                'answer_id': answer_id,
+                'matched': matched,
+                'matched_by': matched_by,
+                'score': max_similarity,
+                'threshold': threshold,
+                'category': predicted_category,
+                'category_probabilities': {
+                    str(category): float(probability)
+                    for category, probability in zip(self.classifier.classes_, probabilities)
+                },
+                'candidates': [
+                    {
+                        'id': self.entries[i]['id'],
+                        'question': self.entries[i]['question'],
+                        'category': self.entries[i]['category'],
+                        'score': float(scores[i])
+                    }
+                    # Entries sharing nothing with the query are not worth suggesting
+                    for i in top if scores[i] > 0
+                ]
+            }
             
         except Exception as e:
             print(f"Error finding response: {e}")
-            return self._get_general_help_response()
+            return self._empty_result(self._get_general_help_response())
     
     def _get_category_response(self, category):
         """Get general response based on category"""
@@ -365,7 +615,7 @@ class GovernmentChatbot:
             "contact": "I can provide contact information for WRD Bihar offices including phone numbers, email, and office hours. What contact information do you need?",
             "schemes": "I can provide information about government schemes like PMKSY and other water resource related schemes. Which scheme would you like to know about?"
         }
-        return category_responses.get(category, self._get_general_help_response()).get(category, self._get_general_help_response())
+        return category_responses.get(category, self._get_general_help_response())
     
     def _get_general_help_response(self):
         return "I'm here to help you with Bihar Water Resources Department (WRD) services and information. You can ask me about:\n- Irrigation connections and applications\n- Required documents and procedures\n- Irrigation charges and fees\n- Water availability status\n- Online complaint registration\n- Contact information\n- Government schemes like PMKSY\n\nPlease let me know what specific information you need."
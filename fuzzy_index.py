@@ -0,0 +1,179 @@
+import re
+import unicodedata
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from indic_transliteration import sanscript
+from indic_transliteration.sanscript import transliterate
+
+DEVANAGARI = re.compile(r'[\u0900-\u097f]')
+WORD = re.compile(r'[\w\u0900-\u0963]+')
+
+
+class FuzzyIndex:
+    """Typo-tolerant fallback index over the words of questions and keywords.
+
+    Words are folded to a loose Latin spelling (Devanagari is romanized, so
+    "sinchai" finds सिंचाई), split into padded character trigrams, and looked
+    up through trigram postings. Only vocabulary terms sharing a trigram with
+    the query are scored, by Dice similarity of their trigram sets, and a
+    candidate only counts if it is also within a few edits of the query word;
+    shared suffixes alone ("election", "connection") do not make a match.
+
+    One misspelled word is not enough evidence on its own ("waiter" is one
+    edit from "water"): an entry needs a query word matching exactly after
+    folding, or at least two query words matching fuzzily.
+    """
+
+    FOLDS = [('sh', 's'), ('ch', 'c'), ('ph', 'f'), ('w', 'v'), ('z', 'j'), ('ee', 'i'), ('oo', 'u')]
+
+    # Hindi question words and postpositions, matched after folding in either script
+    HINDI_STOP_WORDS = ['kya', 'hai', 'hain', 'kaise', 'kaun', 'kab', 'kahan', 'liye', 'lie', 'mein', 'aur',
+                        'karen', 'kare', 'karna', 'chahiye', 'batao', 'bataiye']
+
+    def __init__(self, min_similarity=0.4, min_length=3):
+        self.min_similarity = min_similarity
+        self.min_length = min_length
+        self.postings = {}
+        self.vocabulary = []
+        self.term_lengths = None
+        self.term_sizes = None
+        self.term_entries = None
+        self._stop_words = {self.fold(word) for word in self.HINDI_STOP_WORDS}
+
+    @staticmethod
+    def romanize(word):
+        """Devanagari word in ITRANS, without the inherent final vowel Hindi does not pronounce"""
+        # Anusvara (M) and candrabindu (.N) are usually typed as n
+        word = transliterate(word, sanscript.DEVANAGARI, sanscript.ITRANS).replace('.N', 'n').replace('M', 'n')
+        if len(word) > 3 and word.endswith('a') and word[-2] not in 'aeiouAEIOU':
+            word = word[:-1]
+        return word
+
+    @classmethod
+    def fold(cls, word):
+        """Collapse spelling variation: diacritics, aspirates, nasals and doubled letters"""
+        if DEVANAGARI.search(word):
+            word = cls.romanize(word)
+        word = unicodedata.normalize('NFKD', word)
+        word = ''.join(c for c in word if not unicodedata.combining(c)).lower()
+        for old, new in cls.FOLDS:
+            word = word.replace(old, new)
+        # Anusvara and nasals before a consonant are written m, n or M interchangeably
+        word = re.sub(r'[mn](?=[^aeiou\W])', 'n', word)
+        return re.sub(r'(.)\1+', r'\1', word)
+
+    def terms(self, text):
+        """Distinct folded words of text, without stop words and short words"""
+        terms = []
+        for word in WORD.findall(text.lower()):
+            if word in ENGLISH_STOP_WORDS:
+                continue
+            term = self.fold(word)
+            if len(term) >= self.min_length and term not in self._stop_words and term not in terms:
+                terms.append(term)
+        return terms
+
+    @staticmethod
+    def trigrams(term):
+        padded = f"${term}$"
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    @staticmethod
+    def max_edits(term):
+        """Edits tolerated in a query word: one up to five letters, two beyond"""
+        return 1 if len(term) <= 5 else 2
+
+    @staticmethod
+    def edit_distances(term, words):
+        """Edit distance from term to each word, counting an adjacent transposition as one edit
+
+        Bit-parallel (Hyyro 2003): one machine-word pass per character of each word.
+        """
+        if not term:
+            return [len(word) for word in words]
+        mask = (1 << len(term)) - 1
+        last = 1 << (len(term) - 1)
+        positions = {}
+        for i, char in enumerate(term):
+            positions[char] = positions.get(char, 0) | 1 << i
+
+        distances = []
+        for word in words:
+            vp, vn, d0, previous = mask, 0, 0, 0
+            distance = len(term)
+            for char in word:
+                pm = positions.get(char, 0)
+                transposed = ((~d0 & pm) << 1) & previous
+                d0 = ((((pm & vp) + vp) & mask) ^ vp) | pm | vn | transposed
+                hp = vn | (~(d0 | vp) & mask)
+                hn = d0 & vp
+                distance += (hp & last != 0) - (hn & last != 0)
+                hp = ((hp << 1) | 1) & mask
+                hn = (hn << 1) & mask
+                vp = hn | (~(d0 | hp) & mask)
+                vn = hp & d0
+                previous = pm
+            distances.append(distance)
+        return distances
+
+    def fit(self, entries):
+        vocabulary = {}
+        rows = []
+        cols = []
+        for position, entry in enumerate(entries):
+            for term in self.terms(f"{entry['question']} {entry.get('keywords') or ''}"):
+                rows.append(vocabulary.setdefault(term, len(vocabulary)))
+                cols.append(position)
+
+        postings = {}
+        sizes = []
+        for term, term_id in vocabulary.items():
+            grams = self.trigrams(term)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(term_id)
+
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self.vocabulary = list(vocabulary)
+        self.term_lengths = np.array([len(term) for term in vocabulary], dtype=np.intp)
+        self.term_sizes = np.array(sizes, dtype=np.float64)
+        self.term_entries = csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(vocabulary), len(entries))
+        )
+        return self
+
+    def score(self, message):
+        """Mean over query words of the best fuzzy match each entry has for that word"""
+        entry_count = self.term_entries.shape[1]
+        scores = np.zeros(entry_count)
+        matched_words = np.zeros(entry_count, dtype=np.intp)
+        exact = np.zeros(entry_count, dtype=bool)
+        terms = self.terms(message)
+        for term in terms:
+            grams = self.trigrams(term)
+            hits = [self.postings[gram] for gram in grams if gram in self.postings]
+            if not hits:
+                continue
+
+            # Candidate terms and the number of trigrams each shares with the query word
+            candidates, shared = np.unique(np.concatenate(hits), return_counts=True)
+            similarity = 2 * shared / (len(grams) + self.term_sizes[candidates])
+            # Trigram overlap finds candidates cheaply; edit distance confirms them
+            limit = self.max_edits(term)
+            keep = (similarity >= self.min_similarity) & (np.abs(self.term_lengths[candidates] - len(term)) <= limit)
+            candidates = candidates[keep]
+            similarity = similarity[keep]
+            close = np.array(self.edit_distances(term, [self.vocabulary[i] for i in candidates])) <= limit
+            if not close.any():
+                continue
+
+            matches = self.term_entries[candidates[close]].multiply(similarity[close][:, None])
+            best = matches.max(axis=0).toarray().ravel()
+            scores += best
+            matched_words += best > 0
+            # Identical trigram sets: the same word once folded
+            exact |= best >= 1.0
+
+        scores[(matched_words < 2) & ~exact] = 0
+        return scores / len(terms) if terms else scores
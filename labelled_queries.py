@@ -0,0 +1,36 @@
+"""Hand-labelled citizen queries for measuring answer accuracy.
+
+Used to report top-1 accuracy only; never tune settings against them, or
+the reported accuracy stops meaning anything.
+"""
+
+# (query, expected answer id) pairs mixing template phrasing and free-form questions
+LABELLED_QUERIES = [
+    ('What is Water Resources Department Bihar?', 'en-01'),
+    ('tell me about WRD', 'en-01'),
+    ('information about water resources department', 'en-01'),
+    ('what are the functions of the department', 'en-02'),
+    ('flood control', 'en-02'),
+    ('inter-state rivers water sharing', 'en-02'),
+    ('how to apply for irrigation connection', 'en-03'),
+    ('irrigation connection application process', 'en-03'),
+    ('new irrigation connection', 'en-03'),
+    ('which documents are required', 'en-04'),
+    ('do I need aadhaar and voter id', 'en-04'),
+    ('land records needed for connection', 'en-04'),
+    ('irrigation charges per acre', 'en-05'),
+    ('what are the fees for rabi crops', 'en-05'),
+    ('kharif rates', 'en-05'),
+    ('check water availability', 'en-06'),
+    ('is there a mobile app for canal water', 'en-06'),
+    ('help with drainage problems', 'en-07'),
+    ('drainage complaint field engineer', 'en-07'),
+    ('contact information', 'en-08'),
+    ('phone number and office hours', 'en-08'),
+    ('toll-free number', 'en-08'),
+    ('register complaint online', 'en-09'),
+    ('track status of my complaint number', 'en-09'),
+    ('what is PMKSY', 'en-10'),
+    ('Pradhan Mantri Krishi Sinchayee Yojana', 'en-10'),
+    ('micro irrigation scheme', 'en-10'),
+]
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+
+
+class QueryLog:
+    """Append-only JSON-lines log of answered queries, written and rotated off the request path.
+
+    record() only puts the entry on an in-memory queue. A writer thread wakes
+    every flush_interval seconds and writes everything queued in one batch,
+    rotating the file to path.1 ... path.<backup_count> once it exceeds
+    max_bytes. When the queue is full, entries are dropped rather than
+    blocking the request; the next batch then includes a
+    {"ts": ..., "dropped": n} line so the loss shows up in the log itself.
+    A "{pid}" placeholder in path gives each worker process its own file.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backup_count=5,
+                 buffer_size=10000, flush_interval=1.0):
+        self.path = path.format(pid=os.getpid())
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._unreported_drops = 0
+        self._drops_lock = threading.Lock()
+        self._queue = queue.Queue(buffer_size)
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(target=self._run, name='query-log-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record(self, entry):
+        """Queue one log entry (a JSON-serializable dict) without waiting for disk"""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._drops_lock:
+                self.dropped += 1
+                self._unreported_drops += 1
+
+    def stats(self):
+        """Where the log is written and how many entries were dropped so far"""
+        return {
+            'path': self.path,
+            'queued': self._queue.qsize(),
+            'dropped': self.dropped
+        }
+
+    def close(self):
+        """Write out queued entries and stop the writer thread"""
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._writer.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        lines = []
+        while True:
+            try:
+                lines.append(json.dumps(self._queue.get_nowait(), ensure_ascii=False))
+            except queue.Empty:
+                break
+        with self._drops_lock:
+            dropped, self._unreported_drops = self._unreported_drops, 0
+        if dropped:
+            lines.append(json.dumps({'ts': time.time(), 'dropped': dropped}))
+        if not lines:
+            return
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            print(f"Could not write query log: {e}")
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+def read_query_log(paths):
+    """Yield entries from query log files, skipping lines that are not valid JSON"""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def create_query_log():
+    """Query log at CHATBOT_QUERY_LOG if set, otherwise None (logging disabled)"""
+    path = os.environ.get('CHATBOT_QUERY_LOG')
+    if path:
+        return QueryLog(path)
+    return None
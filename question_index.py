@@ -0,0 +1,110 @@
+import re
+import numpy as np
+
+
+def group_max(scores, offsets):
+    """Reduce a row score vector to one score per entry (rows grouped contiguously)"""
+    if len(scores) == 0:
+        return scores
+    return np.maximum.reduceat(scores, offsets)
+
+
+class QuestionIndex:
+    """Compact matching index: each canonical question and its keywords are indexed once.
+
+    Template phrasing ("tell me about X", "X procedure", ...) is handled by
+    normalizing the query instead of expanding every keyword at training time.
+    """
+
+    TEMPLATE_PREFIXES = re.compile(
+        r'^(?:please\s+)?(?:'
+        r'what is|what are|tell me about|information about|info about|details about|details of|'
+        r'help with|how to get|how do i get|how can i get|how to apply for|how do i apply for|'
+        r'apply for|i want|i need'
+        r')\s+'
+    )
+    TEMPLATE_SUFFIXES = re.compile(r'\s+(?:procedure|process|details|information|info)$')
+
+    LANGUAGE_CODES = {'english': 'en', 'hindi': 'hi'}
+
+    def __init__(self, question_weight=1.0, keyword_weight=0.8, tie_breaker=0.2, language_bonus=0.05):
+        self.question_weight = question_weight
+        self.keyword_weight = keyword_weight
+        self.tie_breaker = tie_breaker
+        self.language_bonus = language_bonus
+        self.languages = None
+        self.question_matrix = None
+        self.keyword_matrix = None
+        self.keyword_offsets = None
+
+    @classmethod
+    def split_keywords(cls, entry):
+        """Keyword phrases of an entry, always including the question itself as a fallback"""
+        keywords = [k.strip() for k in (entry.get('keywords') or '').split(',')]
+        keywords = [k for k in keywords if len(k) > 2]
+        return keywords or [entry['question']]
+
+    @classmethod
+    def training_documents(cls, entries):
+        """Documents and entry positions used to fit the shared vectorizer and classifier"""
+        documents = []
+        positions = []
+        for position, entry in enumerate(entries):
+            documents.append(entry['question'])
+            positions.append(position)
+            for keyword in cls.split_keywords(entry):
+                documents.append(keyword)
+                positions.append(position)
+        return documents, positions
+
+    @classmethod
+    def normalize_query(cls, message):
+        """Strip template phrasing so only the informative part of the query is matched"""
+        stripped = cls.TEMPLATE_PREFIXES.sub('', message)
+        stripped = cls.TEMPLATE_SUFFIXES.sub('', stripped).strip()
+        return stripped or message
+
+    def fit(self, vectorizer, entries):
+        """Build the field matrices with an already fitted vectorizer"""
+        self.question_matrix = vectorizer.transform([entry['question'] for entry in entries])
+
+        keywords = []
+        offsets = []
+        for entry in entries:
+            offsets.append(len(keywords))
+            keywords.extend(self.split_keywords(entry))
+        self.keyword_matrix = vectorizer.transform(keywords)
+        self.keyword_offsets = np.array(offsets, dtype=np.intp)
+        self.languages = np.array([entry.get('language', '') for entry in entries])
+        return self
+
+    @property
+    def size(self):
+        """Number of indexed rows"""
+        if self.question_matrix is None:
+            return 0
+        return self.question_matrix.shape[0] + self.keyword_matrix.shape[0]
+
+    def score(self, message_vector):
+        """Field-weighted cosine similarity of the query against every entry, in [0, 1]"""
+        # Vectorizer rows are L2-normalized, so a sparse dot product is the cosine
+        question_scores = (self.question_matrix @ message_vector.T).toarray().ravel()
+        keyword_scores = (self.keyword_matrix @ message_vector.T).toarray().ravel()
+        keyword_scores = group_max(keyword_scores, self.keyword_offsets)
+
+        weighted_question = self.question_weight * question_scores
+        weighted_keyword = self.keyword_weight * keyword_scores
+        best = np.maximum(weighted_question, weighted_keyword)
+        other = np.minimum(weighted_question, weighted_keyword)
+        return np.minimum(best + self.tie_breaker * other, 1.0)
+
+    def language_bias(self, language):
+        """Ranking bonus for entries in the user's language
+
+        Bilingual twins sharing a keyword (e.g. PMKSY) then resolve to the
+        user's language. It only orders entries and is never part of a score.
+        """
+        code = self.LANGUAGE_CODES.get(language)
+        if not code:
+            return np.zeros(len(self.languages))
+        return self.language_bonus * (self.languages == code)
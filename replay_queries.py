@@ -0,0 +1,108 @@
+"""Replay a query log against a model artifact and report latency and answer changes.
+
+Usage: python replay_queries.py --model chatbot_model.pkl queries.jsonl [queries.jsonl.1 ...]
+
+Only the matching stages are replayed, so logged latencies are compared
+without their preprocess, session context and translate time. Queries that
+were ranked with session context are replayed without it; they are timed
+and their categories compared, but their answers are not.
+"""
+import argparse
+import pickle
+import sys
+import time
+import numpy as np
+from chatbot import GovernmentChatbot
+from query_log import read_query_log
+
+# Logged stages outside _find_best_response, which is all that replay times
+NON_MATCHING_STAGES = ('preprocess', 'context', 'translate')
+
+
+def load_artifact(path):
+    """Chatbot backed by a saved model, in whatever match mode it was trained with"""
+    with open(path, 'rb') as f:
+        match_mode = pickle.load(f).get('match_mode')
+    chatbot = GovernmentChatbot(match_mode=match_mode, model_path=path, load=False)
+    chatbot.load_existing_model()
+    if not chatbot.trained:
+        sys.exit(f"{path} is not a usable model artifact")
+    return chatbot
+
+
+def count_drops(entries, counts):
+    """Pass entries through, adding the log's dropped-entry markers to counts['dropped']"""
+    for entry in entries:
+        counts['dropped'] += entry.get('dropped', 0)
+        yield entry
+
+
+def replay(chatbot, entries):
+    """Answer every logged query again, yielding (entry, result, latency in ms)"""
+    for entry in entries:
+        if entry.get('error') or not entry.get('query'):
+            continue
+        start = time.perf_counter()
+        result = chatbot._find_best_response(entry['query'], entry.get('language', 'english'))
+        yield entry, result, (time.perf_counter() - start) * 1000
+
+
+def logged_matching_ms(entry):
+    """Logged time spent in the matching stages, or None if the query was not matched"""
+    timings = entry.get('timings_ms', {})
+    if 'total' not in timings or 'rank' not in timings:
+        return None
+    return timings['total'] - sum(timings.get(stage, 0) for stage in NON_MATCHING_STAGES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('logs', nargs='+', help='query log files')
+    parser.add_argument('--model', default='chatbot_model.pkl', help='model artifact to replay against')
+    parser.add_argument('--show-diffs', type=int, default=20, help='answer changes to print')
+    args = parser.parse_args()
+
+    chatbot = load_artifact(args.model)
+
+    latencies = []
+    logged_latencies = []
+    answer_diffs = []
+    category_diffs = 0
+    with_context = 0
+    counts = {'dropped': 0}
+    for entry, result, latency in replay(chatbot, count_drops(read_query_log(args.logs), counts)):
+        latencies.append(latency)
+        logged = logged_matching_ms(entry)
+        if logged is not None:
+            logged_latencies.append(logged)
+        if result['category'] != entry.get('category'):
+            category_diffs += 1
+        # Context does not change the predicted category, but it can change the answer
+        if entry.get('context_turns'):
+            with_context += 1
+        elif result['answer_id'] != entry.get('answer_id'):
+            answer_diffs.append((entry, result))
+
+    if not latencies:
+        sys.exit("No replayable queries in the log")
+
+    print(f"Replayed {len(latencies)} queries against {args.model} ({chatbot.match_mode} mode)")
+    if counts['dropped']:
+        print(f"Warning: the log is incomplete, {counts['dropped']} queries were dropped when its buffer was full")
+    for label, values in (('replay', latencies), ('logged', logged_latencies)):
+        if values:
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            print(f"{label:<8} latency ms  p50 {p50:.3f}  p90 {p90:.3f}  p99 {p99:.3f}  max {max(values):.3f}")
+    compared = len(latencies) - with_context
+    print(f"Answer changed for {len(answer_diffs)} of {compared} queries "
+          f"({len(answer_diffs) / compared if compared else 0:.1%}), category changed for {category_diffs}")
+    if with_context:
+        print(f"Answers of {with_context} queries ranked with session context were not compared")
+
+    for entry, result in answer_diffs[:args.show_diffs]:
+        print(f"  {entry['query']!r}: {entry.get('answer_id')} ({entry.get('score', 0):.3f}) -> "
+              f"{result['answer_id']} ({result['score']:.3f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+
+
+class SessionStore:
+    """In-process conversation context, bounded in sessions, turns per session and age.
+
+    Each turn is a (category, answer_id, timestamp) tuple. Category names and
+    answer ids are interned, so a session only pays for its deque and tuples.
+    """
+
+    def __init__(self, max_sessions=10000, max_turns=5, ttl=30 * 60):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Recent turns of a session, newest first"""
+        now = time.time()
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                return []
+            if now - turns[-1][2] > self.ttl:
+                del self._sessions[session_id]
+                return []
+            self._sessions.move_to_end(session_id)
+            return [turn for turn in reversed(turns) if now - turn[2] <= self.ttl]
+
+    def append(self, session_id, category, answer_id):
+        """Record a turn, evicting expired and least recently used sessions"""
+        turn = (
+            sys.intern(category) if category else None,
+            sys.intern(answer_id) if answer_id else None,
+            time.time()
+        )
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                turns = self._sessions[session_id] = deque(maxlen=self.max_turns)
+            turns.append(turn)
+            self._sessions.move_to_end(session_id)
+            self._evict(turn[2])
+
+    def _evict(self, now):
+        # Sessions are kept in last-use order, so expired ones are at the front
+        while self._sessions:
+            session_id, turns = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - turns[-1][2] <= self.ttl:
+                break
+            del self._sessions[session_id]
+
+    @staticmethod
+    def _turns_bytes(session_id, turns):
+        # Interned category names and answer ids are shared and not counted
+        return (sys.getsizeof(session_id) + sys.getsizeof(turns)
+                + sum(sys.getsizeof(turn) + sys.getsizeof(turn[2]) for turn in turns))
+
+    def session_bytes(self, session_id):
+        """Approximate memory held by one session"""
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            return self._turns_bytes(session_id, turns) if turns is not None else 0
+
+    def stats(self):
+        """Active sessions and their approximate memory use"""
+        with self._lock:
+            # Expired sessions linger until the next append; do not count them
+            self._evict(time.time())
+            sessions = len(self._sessions)
+            total = sum(self._turns_bytes(session_id, turns) for session_id, turns in self._sessions.items())
+        return {
+            'backend': 'memory',
+            'sessions': sessions,
+            'max_sessions': self.max_sessions,
+            'max_turns': self.max_turns,
+            'ttl': self.ttl,
+            'bytes': total,
+            'bytes_per_session': total / sessions if sessions else 0
+        }
+
+
+class SQLiteSessionStore:
+    """Conversation context in a local SQLite file, shared by all workers on the host.
+
+    Every PURGE_INTERVAL writes, expired turns are deleted and only the
+    max_sessions most recently active sessions are kept, so between purges a
+    worker can exceed the cap by at most PURGE_INTERVAL sessions.
+    """
+
+    PURGE_INTERVAL = 100
+
+    def __init__(self, path, max_sessions=10000, max_turns=5, ttl=30 * 60):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS turns ('
+                'session_id TEXT NOT NULL, category TEXT, answer_id TEXT, created REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, created)')
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        """Recent turns of a session, newest first"""
+        rows = self._connection().execute(
+            'SELECT category, answer_id, created FROM turns '
+            'WHERE session_id = ? AND created >= ? ORDER BY created DESC LIMIT ?',
+            (session_id, time.time() - self.ttl, self.max_turns)
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def append(self, session_id, category, answer_id):
+        """Record a turn and trim the session to max_turns"""
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO turns (session_id, category, answer_id, created) VALUES (?, ?, ?, ?)',
+                (session_id, category, answer_id, now)
+            )
+            conn.execute(
+                'DELETE FROM turns WHERE session_id = ? AND rowid NOT IN '
+                '(SELECT rowid FROM turns WHERE session_id = ? ORDER BY created DESC LIMIT ?)',
+                (session_id, session_id, self.max_turns)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_INTERVAL == 0:
+                self._purge(conn, now)
+
+    def _purge(self, conn, now):
+        conn.execute('DELETE FROM turns WHERE created < ?', (now - self.ttl,))
+        conn.execute(
+            'DELETE FROM turns WHERE session_id IN (SELECT session_id FROM turns '
+            'GROUP BY session_id ORDER BY MAX(created) DESC LIMIT -1 OFFSET ?)',
+            (self.max_sessions,)
+        )
+
+    def stats(self):
+        """Active sessions and the size of the backing file"""
+        sessions = self._connection().execute(
+            'SELECT COUNT(DISTINCT session_id) FROM turns WHERE created >= ?',
+            (time.time() - self.ttl,)
+        ).fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'sessions': sessions,
+            'max_sessions': self.max_sessions,
+            'max_turns': self.max_turns,
+            'ttl': self.ttl,
+            'bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+
+def create_session_store():
+    """SQLite store when CHATBOT_SESSION_DB is set, otherwise an in-process store"""
+    path = os.environ.get('CHATBOT_SESSION_DB')
+    if path:
+        return SQLiteSessionStore(path)
+    return SessionStore()
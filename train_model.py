@@ -0,0 +1,185 @@
+"""Tune the vectorizer and classifier with a cross-validated, process-parallel grid search.
+
+Usage: python train_model.py [--match-mode compact] [--jobs N] [--output chatbot_model.pkl]
+
+Each entry's keyword phrases are split into folds. A fold's phrases are
+held out of training and then asked as queries, which must come back with
+their entry's answer. Settings are ranked by held-out top-1 answer
+accuracy, then classifier category accuracy, then per-query latency.
+Top-1 on the labelled benchmark queries is printed for information but
+never used for ranking, so it stays an independent check. Answers depend only on the
+vectorizer, so the classifier's alpha is chosen per vectorizer setting by
+category accuracy alone. The best setting is retrained on all entries and
+saved.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+from chatbot import GovernmentChatbot, MATCH_MODES
+from labelled_queries import LABELLED_QUERIES
+
+# Default token pattern, but keeping Devanagari vowel signs and viramas inside words
+DEVANAGARI_TOKEN_PATTERN = r'(?u)(?:\w|[\u0900-\u0903\u093a-\u094f\u0951-\u0957\u0962\u0963]){2,}'
+
+ALPHAS = [0.1, 0.3, 1.0]
+
+# What GovernmentChatbot uses out of the box, reported as the baseline
+DEFAULT_SETTING = ({'stop_words': 'english', 'ngram_range': (1, 1), 'sublinear_tf': False, 'max_features': 5000}, 1.0)
+
+
+def vectorizer_grid():
+    """Vectorizer settings to search"""
+    grid = []
+    for stop_words, token_pattern, ngram_range, sublinear_tf, max_features in itertools.product(
+            ['english', None], [None, DEVANAGARI_TOKEN_PATTERN], [(1, 1), (1, 2)], [False, True], [5000]):
+        params = {'stop_words': stop_words, 'ngram_range': ngram_range,
+                  'sublinear_tf': sublinear_tf, 'max_features': max_features}
+        if token_pattern:
+            params['token_pattern'] = token_pattern
+        grid.append(params)
+    # Character n-grams inside word boundaries work for Devanagari and misspellings alike
+    for ngram_range, sublinear_tf, max_features in itertools.product(
+            [(2, 4), (3, 5)], [False, True], [5000, 20000]):
+        grid.append({'analyzer': 'char_wb', 'ngram_range': ngram_range,
+                     'sublinear_tf': sublinear_tf, 'max_features': max_features})
+    return grid
+
+
+def make_folds(entries, folds):
+    """(training entries, held-out (phrase, answer id) queries) for each fold"""
+    splits = []
+    for fold in range(folds):
+        training = []
+        held_out = []
+        for entry in entries:
+            keywords = [k.strip() for k in entry['keywords'].split(',') if len(k.strip()) > 2]
+            kept = [k for i, k in enumerate(keywords) if i % folds != fold]
+            held_out.extend((k, entry['id']) for i, k in enumerate(keywords) if i % folds == fold)
+            training.append(dict(entry, keywords=', '.join(kept)))
+        splits.append((training, held_out))
+    return splits
+
+
+def build(match_mode, vectorizer_params, alpha):
+    chatbot = GovernmentChatbot(match_mode=match_mode, load=False)
+    chatbot.vectorizer = TfidfVectorizer(**vectorizer_params)
+    chatbot.classifier = MultinomialNB(alpha=alpha)
+    return chatbot
+
+
+def answer(chatbot, query):
+    return chatbot._find_best_response(chatbot._preprocess_message(query, 'english'))
+
+
+def evaluate(match_mode, vectorizer_params, entries, splits):
+    """Score one vectorizer setting and pick its best alpha; runs in a worker process"""
+    # Keep the per-fold training messages out of the search output
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _evaluate(match_mode, vectorizer_params, entries, splits)
+
+
+def _evaluate(match_mode, vectorizer_params, entries, splits):
+    correct = 0
+    total = 0
+    latencies = []
+    category_correct = dict.fromkeys(ALPHAS, 0)
+    categories = {entry['id']: entry['category'] for entry in entries}
+
+    for training, held_out in splits:
+        chatbot = build(match_mode, vectorizer_params, ALPHAS[0])
+        X, y = chatbot.train(training)
+        for query, answer_id in held_out:
+            start = time.perf_counter()
+            result = answer(chatbot, query)
+            latencies.append(time.perf_counter() - start)
+            correct += result['answer_id'] == answer_id
+            total += 1
+
+        # Features are built once per fold; only the classifier is refit per alpha
+        queries = chatbot.vectorizer.transform(
+            [chatbot._preprocess_message(query, 'english') for query, _ in held_out])
+        expected = [categories[answer_id] for _, answer_id in held_out]
+        for alpha in ALPHAS:
+            predicted = MultinomialNB(alpha=alpha).fit(X, y).predict(queries)
+            category_correct[alpha] += sum(p == e for p, e in zip(predicted, expected))
+
+    chatbot = build(match_mode, vectorizer_params, ALPHAS[0])
+    chatbot.train(entries)
+    labelled = sum(answer(chatbot, query)['answer_id'] == answer_id for query, answer_id in LABELLED_QUERIES)
+
+    category_accuracy = {alpha: category_correct[alpha] / total for alpha in ALPHAS}
+    best_alpha = max(ALPHAS, key=category_accuracy.get)
+    return {
+        'vectorizer': vectorizer_params,
+        'alpha': best_alpha,
+        'cv_top1': correct / total,
+        'labelled_top1': labelled / len(LABELLED_QUERIES),
+        'category_accuracy': category_accuracy[best_alpha],
+        'category_accuracy_by_alpha': category_accuracy,
+        'latency_ms': float(np.mean(latencies)) * 1000
+    }
+
+
+def rank_key(result):
+    # labelled_top1 is deliberately left out: the labelled queries are held back for reporting
+    return (-result['cv_top1'], -result['category_accuracy'], result['latency_ms'])
+
+
+def describe(params):
+    return ' '.join(f"{key}={value}" for key, value in params.items() if key != 'token_pattern') + (
+        ' token_pattern=devanagari' if 'token_pattern' in params else '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--match-mode', choices=MATCH_MODES,
+                        default=os.environ.get('CHATBOT_MATCH_MODE', 'variations'))
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--output', default='chatbot_model.pkl', help='where to write the best model')
+    parser.add_argument('--top', type=int, default=10, help='settings to print')
+    parser.add_argument('--dry-run', action='store_true', help='search only, do not write a model')
+    args = parser.parse_args()
+
+    entries = GovernmentChatbot(match_mode=args.match_mode, load=False).get_knowledge_entries()
+    splits = make_folds(entries, args.folds)
+    grid = vectorizer_grid()
+
+    print(f"Searching {len(grid)} vectorizer settings, each with the best of {len(ALPHAS)} alphas, "
+          f"with {args.folds}-fold cross-validation on {args.jobs} processes")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(evaluate, args.match_mode, params, entries, splits) for params in grid]
+        results = [future.result() for future in futures]
+    print(f"Search took {time.perf_counter() - start:.1f}s")
+
+    results.sort(key=rank_key)
+    print("Ranked by cv top-1, then category accuracy, then latency; labelled top-1 is not used for ranking")
+    print(f"{'cv top-1':>9}{'category':>9}{'ms/query':>9}{'labelled':>9}  setting")
+    for result in results[:args.top]:
+        print(f"{result['cv_top1']:>9.2%}{result['category_accuracy']:>9.2%}{result['latency_ms']:>9.3f}"
+              f"{result['labelled_top1']:>9.2%}  alpha={result['alpha']} {describe(result['vectorizer'])}")
+    default_params, default_alpha = DEFAULT_SETTING
+    for result in results:
+        if result['vectorizer'] == default_params:
+            print(f"Default: {result['cv_top1']:.2%} cv top-1, {result['labelled_top1']:.2%} labelled top-1, "
+                  f"{result['category_accuracy_by_alpha'][default_alpha]:.2%} category at alpha={default_alpha}, "
+                  f"rank {results.index(result) + 1} of {len(results)}")
+
+    if args.dry_run:
+        return
+    best = results[0]
+    chatbot = build(args.match_mode, best['vectorizer'], best['alpha'])
+    chatbot.model_path = args.output
+    chatbot.load_and_process_data()
+
+
+if __name__ == '__main__':
+    main()